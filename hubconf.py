@@ -9,6 +9,7 @@ from pathlib import Path
 
 import torch
 
+from models.experimental import ckpt_model
 from models.yolo import Model
 from utils.general import check_requirements, set_logging
 from utils.google_utils import attempt_download
@@ -37,13 +38,13 @@ def create(name, pretrained, channels, classes, autoshape):
         if pretrained:
             fname = f'{name}.pt'  # checkpoint filename
             attempt_download(fname)  # download if not found locally
-            ckpt = torch.load(fname, map_location=torch.device('cpu'))  # load
+            ckpt = ckpt_model(torch.load(fname, map_location=torch.device('cpu')), 'model')  # load FP32 model
             msd = model.state_dict()  # model state_dict
-            csd = ckpt['model'].float().state_dict()  # checkpoint state_dict as FP32
+            csd = ckpt.state_dict()  # checkpoint state_dict as FP32
             csd = {k: v for k, v in csd.items() if msd[k].shape == v.shape}  # filter
             model.load_state_dict(csd, strict=False)  # load
-            if len(ckpt['model'].names) == classes:
-                model.names = ckpt['model'].names  # set class names attribute
+            if len(ckpt.names) == classes:
+                model.names = ckpt.names  # set class names attribute
             if autoshape:
                 model = model.autoshape()  # for file/URI/PIL/cv2/np inputs and NMS
         device = select_device('0' if torch.cuda.is_available() else 'cpu')  # default to GPU if available
@@ -68,7 +69,7 @@ def custom(path_or_model='path/to/model.pt', autoshape=True):
     """
     model = torch.load(path_or_model) if isinstance(path_or_model, str) else path_or_model  # load checkpoint
     if isinstance(model, dict):
-        model = model['ema' if model.get('ema') else 'model']  # load model
+        model = ckpt_model(model)  # load model, ema if present
 
     hub_model = Model(model.yaml).to(next(model.parameters()).device)  # create
     hub_model.load_state_dict(model.float().state_dict())  # load state_dict
@@ -1,11 +1,14 @@
 # YOLOv5 experimental modules
 
+from copy import deepcopy
+
 import numpy as np
 import torch
 import torch.nn as nn
 
 from models.common import Conv, DWConv
 from utils.google_utils import attempt_download
+from utils.torch_utils import ckpt_state_dict
 
 
 class CrossConv(nn.Module):
@@ -110,13 +113,28 @@ class Ensemble(nn.ModuleList):
         return y, None  # inference, train output
 
 
+def ckpt_model(ckpt, key=None):
+    # Returns FP32 model from checkpoint entry 'key' (default 'ema' if present else 'model'), rebuilding Model() for
+    # state_dict-only checkpoints saved as 'key_state_dict' with 'yaml' and 'names'
+    key = key or ('ema' if ckpt.get('ema') is not None or ckpt.get('ema_state_dict') is not None else 'model')
+    if ckpt.get(key) is not None:
+        return ckpt[key].float()
+
+    from models.yolo import Model  # not at module level, models.yolo imports models.experimental
+    state_dict = ckpt_state_dict(ckpt, key)
+    model = Model(deepcopy(ckpt['yaml'])).to(next(iter(state_dict.values())).device)  # on torch.load map_location
+    model.load_state_dict(state_dict)
+    model.names = ckpt['names']
+    return model
+
+
 def attempt_load(weights, map_location=None):
     # Loads an ensemble of models weights=[a,b,c] or a single model weights=[a] or weights=a
     model = Ensemble()
     for w in weights if isinstance(weights, list) else [weights]:
         attempt_download(w)
         ckpt = torch.load(w, map_location=map_location)  # load
-        model.append(ckpt['ema' if ckpt.get('ema') else 'model'].float().fuse().eval())  # FP32 model
+        model.append(ckpt_model(ckpt).fuse().eval())  # FP32 model
 
     # Compatibility updates
     for m in model.modules():
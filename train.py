@@ -1,4 +1,5 @@
 import argparse
+import contextlib
 import logging
 import math
 import os
@@ -28,46 +29,58 @@ import test  # import test.py to get mAP after each epoch
 from models.experimental import attempt_load
 from models.yolo import Model
 from utils.autoanchor import check_anchors
-from utils.datasets import create_dataloader, LoadImagesAndLabels
+from utils.datasets import create_dataloader, LoadImagesAndLabels, DataPrefetcher
 from utils.general import labels_to_class_weights, increment_path, labels_to_image_weights, init_seeds, \
     fitness, strip_optimizer, get_latest_run, check_dataset, check_file, check_git_status, check_img_size, \
     check_requirements, print_mutation, set_logging, one_cycle, colorstr, non_max_suppression, xyxy2xywh
 from utils.google_utils import attempt_download
 from utils.loss import ComputeLoss
 from utils.plots import plot_images, plot_labels, plot_results, plot_evolution
-from utils.torch_utils import ModelEMA, select_device, intersect_dicts, torch_distributed_zero_first, is_parallel
+from utils.torch_utils import ModelEMA, select_device, intersect_dicts, torch_distributed_zero_first, is_parallel, \
+    half_state_dict, cpu_state_dict, ckpt_state_dict
 from utils.wandb_logging.wandb_utils import WandbLogger, check_wandb_resume
 
 logger = logging.getLogger(__name__)
 
 
 class semiDataset(Dataset):
-    def __init__(self, imgs, target, path):
+    # Pseudo-labeled images stored as one (N,3,h,w) uint8 tensor, labels as one (M,6) tensor split per image by n
+    def __init__(self, imgs, target, n, path):
         self.imgs = imgs
         self.target = target
+        self.offsets = np.cumsum([0, *n]).tolist()  # image i labels are target[offsets[i]:offsets[i + 1]]
         self.path = path
         self.size = None
 
     def __len__(self):
         return len(self.imgs)
 
-    def __getitem__(self, index):
-        return self.imgs[index], self.target[index], self.path[index], self.size
+    def __getitem__(self, index):  # views, no copies
+        return self.imgs[index], self.target[self.offsets[index]:self.offsets[index + 1]], self.path[index], self.size
 
 
 def getpresudolabel(dataloader, opt, model, device):
-    model.eval()
-    img = []
-    target = []
+    cuda = device.type != 'cpu'
+    teacher = deepcopy(model.module if is_parallel(model) else model).eval()  # inference copy of model
+    teacher = teacher.half() if cuda else teacher.float()  # FP16 only supported on CUDA
+    traced, traced_shape = None, None  # TorchScript teacher, traced once when batch shapes are fixed (no --rect)
+    img = []  # uint8 image batches
+    target = []  # label batches
+    n_target = []  # number of labels per image
     Path = []
     imgz = opt.img_size
     # batch_size = opt.batch_size
-    for idx, batch in tqdm(enumerate(dataloader), total=len(dataloader)):
+    for batch, imgs in tqdm(DataPrefetcher(dataloader, device), total=len(dataloader)):  # H2D copy on side stream
         imgs0, _, path, _ = batch
-        imgs = imgs0.to(device, non_blocking=True).float() / 255.0
-        
+        imgs = (imgs.half() if cuda else imgs.float()) / 255.0  # uint8 to fp16/32, 0-255 to 0.0-1.0
+        imgs = imgs.contiguous(memory_format=torch.channels_last)  # NHWC
+
         with torch.no_grad():
-            pred = model(imgs)[0]
+            if traced is None and not opt.rect:
+                traced, traced_shape = torch.jit.trace(teacher, imgs, strict=False, check_trace=False), imgs.shape
+            # Detect() grids are traced as constants, other shapes (i.e. smaller last batch) run eager
+            pred = (traced if imgs.shape == traced_shape else teacher)(imgs)[0]
+        pred = pred.float()  # FP32 for NMS
 
         """Runs Non-Maximum Suppression (NMS) on inference results
 
@@ -76,24 +89,25 @@ def getpresudolabel(dataloader, opt, model, device):
         """
         # print(imgs0.size())
 
-        gn = torch.tensor(imgs0.shape)[[3, 2, 3, 2]]
+        gn = torch.tensor(imgs0.shape, device=device)[[3, 2, 3, 2]]  # normalization gain whwh
         pred = non_max_suppression(pred, opt.conf_thres, opt.iou_thres, classes=opt.classes, agnostic=opt.agnostic_nms)
-        
-        for index, pre in enumerate(pred):
-            predict_number = len(pre)
-            if predict_number==0:
-                continue
-            Class = pre[:,5].view(predict_number,1).cpu()
-            XYWH = (xyxy2xywh(pre[:,:4])).cpu()
-            XYWH/= gn     
-            pre = torch.cat((torch.zeros(predict_number,1),Class,XYWH), dim=1)    
-            img.append(imgs0[index])
-            target.append(pre)
-            Path.append(path[index])
-            
-    print(len(target))
-    dataset = semiDataset(img, target, Path)
-    model.train()
+
+        # Build normalized [0, cls, xywh] labels for the whole batch on device, then copy to CPU once
+        n = [len(pre) for pre in pred]  # number of predictions per image
+        pred = torch.cat(pred, 0)  # (N,6) [xyxy, conf, cls]
+        if not len(pred):
+            continue
+        labels = torch.cat((pred.new_zeros(len(pred), 1), pred[:, 5:6], xyxy2xywh(pred[:, :4]) / gn), dim=1)
+        keep = [index for index, x in enumerate(n) if x]  # images with predictions
+        img.append(imgs0 if len(keep) == len(n) else imgs0[keep])  # CPU uint8 images, one chunk per batch
+        target.append(labels.cpu())  # rows are ordered by image, empty images contribute none
+        n_target.extend(n[index] for index in keep)
+        Path.extend(path[index] for index in keep)
+
+    print(len(n_target))
+    imgs = torch.cat(img, 0) if img else torch.zeros(0, dtype=torch.uint8)
+    dataset = semiDataset(imgs, torch.cat(target, 0) if target else torch.zeros(0, 6), n_target, Path)
+    del teacher, traced  # free traced modules
     return dataset    
         
 
@@ -101,6 +115,29 @@ def getpresudolabel(dataloader, opt, model, device):
 
 
 
+class CheckpointWriter(Thread):
+    # Saves checkpoint to last.pt and optionally best.pt in the background, join() re-raises any write error
+    def __init__(self, ckpt, last, best=None):
+        super().__init__()
+        self.ckpt, self.last, self.best = ckpt, last, best
+        self.error = None
+
+    def run(self):
+        try:
+            torch.save(self.ckpt, self.last)
+            if self.best:
+                torch.save(self.ckpt, self.best)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ckpt = None  # free checkpoint memory
+
+    def join(self, timeout=None):
+        super().join(timeout)
+        if self.error is not None:
+            raise self.error
+
+
 def train(hyp, opt, device, tb_writer=None):
     logger.info(colorstr('hyperparameters: ') + ', '.join(f'{k}={v}' for k, v in hyp.items()))
     save_dir, epochs, batch_size, total_batch_size, weights, rank = \
@@ -148,14 +185,16 @@ def train(hyp, opt, device, tb_writer=None):
         with torch_distributed_zero_first(rank):
             attempt_download(weights)  # download if not found locally
         ckpt = torch.load(weights, map_location=device)  # load checkpoint
-        model = Model(opt.cfg or ckpt['model'].yaml, ch=3, nc=nc, anchors=hyp.get('anchors')).to(device)  # create
+        cfg = opt.cfg or (ckpt['model'].yaml if ckpt.get('model') is not None else ckpt['yaml'])
+        model = Model(cfg, ch=3, nc=nc, anchors=hyp.get('anchors')).to(device)  # create
         exclude = ['anchor'] if (opt.cfg or hyp.get('anchors')) and not opt.resume else []  # exclude keys
-        state_dict = ckpt['model'].float().state_dict()  # to FP32
+        state_dict = ckpt_state_dict(ckpt)  # to FP32
         state_dict = intersect_dicts(state_dict, model.state_dict(), exclude=exclude)  # intersect
         model.load_state_dict(state_dict, strict=False)  # load
         logger.info('Transferred %g/%g items from %s' % (len(state_dict), len(model.state_dict()), weights))  # report
     else:
         model = Model(opt.cfg, ch=3, nc=nc, anchors=hyp.get('anchors')).to(device)  # create
+    model = model.to(memory_format=torch.channels_last)  # NHWC layout for cuDNN Tensor Core convolutions
     with torch_distributed_zero_first(rank):
         check_dataset(data_dict)  # check
     train_path = data_dict['train']
@@ -176,13 +215,13 @@ def train(hyp, opt, device, tb_writer=None):
     logger.info(f"Scaled weight_decay = {hyp['weight_decay']}")
 
     pg0, pg1, pg2 = [], [], []  # optimizer parameter groups
-    for k, v in model.named_modules():
-        if hasattr(v, 'bias') and isinstance(v.bias, nn.Parameter):
-            pg2.append(v.bias)  # biases
-        if isinstance(v, nn.BatchNorm2d):
-            pg0.append(v.weight)  # no decay
-        elif hasattr(v, 'weight') and isinstance(v.weight, nn.Parameter):
-            pg1.append(v.weight)  # apply decay
+    for k, v in model.named_parameters():
+        if k.endswith('.bias'):
+            pg2.append(v)  # biases
+        elif v.ndim == 1:  # BatchNorm2d weights, conv/linear weights are >= 2D
+            pg0.append(v)  # no decay
+        else:
+            pg1.append(v)  # apply decay
 
     if opt.adam:
         optimizer = optim.Adam(pg0, lr=hyp['lr0'], betas=(hyp['momentum'], 0.999))  # adjust beta1 to momentum
@@ -208,6 +247,7 @@ def train(hyp, opt, device, tb_writer=None):
 
     # Resume
     start_epoch, best_fitness = 0, 0.0
+    results_text = ''  # results.txt contents, kept in memory for checkpoints
     if pretrained:
         # Optimizer
         if ckpt['optimizer'] is not None:
@@ -215,13 +255,14 @@ def train(hyp, opt, device, tb_writer=None):
             best_fitness = ckpt['best_fitness']
 
         # EMA
-        if ema and ckpt.get('ema'):
-            ema.ema.load_state_dict(ckpt['ema'].float().state_dict())
+        if ema and (ckpt.get('ema') is not None or ckpt.get('ema_state_dict') is not None):
+            ema.ema.load_state_dict(ckpt_state_dict(ckpt, 'ema'))
             ema.updates = ckpt['updates']
 
         # Results
         if ckpt.get('training_results') is not None:
-            results_file.write_text(ckpt['training_results'])  # write results.txt
+            results_text = ckpt['training_results']
+            results_file.write_text(results_text)  # write results.txt
 
         # Epochs
         start_epoch = ckpt['epoch'] + 1
@@ -255,14 +296,17 @@ def train(hyp, opt, device, tb_writer=None):
         dataloader, dataset, unlabeldataloader = create_dataloader(train_path, imgsz, batch_size, gs, opt,
                                                     hyp=hyp, augment=True, cache=opt.cache_images, rect=opt.rect, rank=rank,
                                                     world_size=opt.world_size, workers=opt.workers,
-                                                    image_weights=opt.image_weights, quad=opt.quad, prefix=colorstr('train: '), do_semi=opt.do_semi)
+                                                    image_weights=opt.image_weights, quad=opt.quad, prefix=colorstr('train: '), do_semi=opt.do_semi,
+                                                    pin_memory=cuda, semi_batch_size=batch_size * 2)
     else:
         dataloader, dataset = create_dataloader(train_path, imgsz, batch_size, gs, opt,
                                             hyp=hyp, augment=True, cache=opt.cache_images, rect=opt.rect, rank=rank,
                                             world_size=opt.world_size, workers=opt.workers,
-                                            image_weights=opt.image_weights, quad=opt.quad, prefix=colorstr('train: '), do_semi=opt.do_semi)
+                                            image_weights=opt.image_weights, quad=opt.quad, prefix=colorstr('train: '), do_semi=opt.do_semi,
+                                            pin_memory=cuda)
 
-    mlc = np.concatenate(dataset.labels, 0)[:, 0].max()  # max label class
+    labels = np.concatenate(dataset.labels, 0)  # all labels, concatenated once
+    mlc = labels[:, 0].max()  # max label class
     nb = len(dataloader)  # number of batches
 
 
@@ -273,10 +317,9 @@ def train(hyp, opt, device, tb_writer=None):
         testloader = create_dataloader(test_path, imgsz_test, batch_size * 2, gs, opt,  # testloader
                                        hyp=hyp, cache=opt.cache_images and not opt.notest, rect=True, rank=-1,
                                        world_size=opt.world_size, workers=opt.workers,
-                                       pad=0.5, prefix=colorstr('val: '), do_semi=False)[0]
+                                       pad=0.5, prefix=colorstr('val: '), do_semi=False, pin_memory=cuda)[0]
 
         if not opt.resume:
-            labels = np.concatenate(dataset.labels, 0)
             c = torch.tensor(labels[:, 0])  # classes
             # cf = torch.bincount(c.long(), minlength=nc) + 1.  # frequency
             # model._initialize_biases(cf.to(device))
@@ -292,9 +335,12 @@ def train(hyp, opt, device, tb_writer=None):
 
     # DDP mode
     if cuda and rank != -1:
+        # find_unused_parameters=True traverses the autograd graph every backward, only opt in where required:
+        # nn.MultiheadAttention incompatibility with DDP https://github.com/pytorch/pytorch/issues/26698
+        find_unused = any(isinstance(layer, nn.MultiheadAttention) for layer in model.modules())  # scanned once
         model = DDP(model, device_ids=[opt.local_rank], output_device=opt.local_rank,
-                    # nn.MultiheadAttention incompatibility with DDP https://github.com/pytorch/pytorch/issues/26698
-                    find_unused_parameters=any(isinstance(layer, nn.MultiheadAttention) for layer in model.modules()))
+                    find_unused_parameters=find_unused,  # False for conv-only models
+                    gradient_as_bucket_view=True)  # param.grad as views into allreduce buckets, saves a grad copy
 
     # Model parameters
     hyp['box'] *= 3. / nl  # scale to layers
@@ -304,7 +350,9 @@ def train(hyp, opt, device, tb_writer=None):
     model.nc = nc  # attach number of classes to model
     model.hyp = hyp  # attach hyperparameters to model
     model.gr = 1.0  # iou loss ratio (obj_loss = 1.0 or iou)
-    model.class_weights = labels_to_class_weights(dataset.labels, nc).to(device) * nc  # attach class weights
+    cw = labels_to_class_weights(labels, nc)  # class weights
+    cw = cw.pin_memory() if cuda else cw  # page-locked for async H2D copy
+    model.class_weights = cw.to(device, non_blocking=True) * nc  # attach class weights
     model.names = names
 
     # Start training
@@ -316,6 +364,7 @@ def train(hyp, opt, device, tb_writer=None):
     scheduler.last_epoch = start_epoch - 1  # do not move
     scaler = amp.GradScaler(enabled=cuda)
     compute_loss = ComputeLoss(model)  # init loss class
+    save_thread = None  # background checkpoint writer
     logger.info(f'Image sizes {imgsz} train, {imgsz_test} test\n'
                 f'Using {dataloader.num_workers} dataloader workers\n'
                 f'Logging results to {save_dir}\n'
@@ -356,7 +405,7 @@ def train(hyp, opt, device, tb_writer=None):
                             batch_size=batch_size,
                             num_workers=opt.workers,
                             sampler=None,
-                            pin_memory=True,
+                            pin_memory=cuda,
                             shuffle=True,
                             collate_fn=LoadImagesAndLabels.collate_fn)
             nb = len(dataloader)
@@ -385,21 +434,23 @@ def train(hyp, opt, device, tb_writer=None):
         logger.info(('\n' + '%10s' * 8) % ('Epoch', 'gpu_mem', 'box', 'obj', 'cls', 'total', 'labels', 'img_size'))
         if rank in [-1, 0]:
             pbar = tqdm(pbar, total=nb)  # progress bar
-        optimizer.zero_grad()
+        optimizer.zero_grad(set_to_none=True)  # free grads instead of zero-filling them
         for i, (imgs, targets, paths, _) in pbar:  # batch -------------------------------------------------------------
             ni = i + nb * epoch  # number integrated batches (since train start)
             imgs = imgs.to(device, non_blocking=True).float() / 255.0  # uint8 to float32, 0-255 to 0.0-1.0
+            imgs = imgs.contiguous(memory_format=torch.channels_last)  # NHWC, matches model memory format
 
             # Warmup
             if ni <= nw:
-                xi = [0, nw]  # x interp
-                # model.gr = np.interp(ni, xi, [0.0, 1.0])  # iou loss ratio (obj_loss = 1.0 or iou)
-                accumulate = max(1, np.interp(ni, xi, [1, nbs / total_batch_size]).round())
+                t = ni / nw  # warmup fraction 0-1, plain float lerp instead of per-scalar np.interp() calls
+                # model.gr = t  # iou loss ratio (obj_loss = 1.0 or iou)
+                accumulate = max(1, round(1 + (nbs / total_batch_size - 1) * t))
                 for j, x in enumerate(optimizer.param_groups):
                     # bias lr falls from 0.1 to lr0, all other lrs rise from 0.0 to lr0
-                    x['lr'] = np.interp(ni, xi, [hyp['warmup_bias_lr'] if j == 2 else 0.0, x['initial_lr'] * lf(epoch)])
+                    lr_start = hyp['warmup_bias_lr'] if j == 2 else 0.0
+                    x['lr'] = lr_start + (x['initial_lr'] * lf(epoch) - lr_start) * t
                     if 'momentum' in x:
-                        x['momentum'] = np.interp(ni, xi, [hyp['warmup_momentum'], hyp['momentum']])
+                        x['momentum'] = hyp['warmup_momentum'] + (hyp['momentum'] - hyp['warmup_momentum']) * t
 
             # Multi-scale
             if opt.multi_scale:
@@ -409,23 +460,26 @@ def train(hyp, opt, device, tb_writer=None):
                     ns = [math.ceil(x * sf / gs) * gs for x in imgs.shape[2:]]  # new shape (stretched to gs-multiple)
                     imgs = F.interpolate(imgs, size=ns, mode='bilinear', align_corners=False)
 
-            # Forward
-            with amp.autocast(enabled=cuda):
-                pred = model(imgs)  # forward
-                loss, loss_items = compute_loss(pred, targets.to(device))  # loss scaled by batch_size
-                if rank != -1:
-                    loss *= opt.world_size  # gradient averaged between devices in DDP mode
-                if opt.quad:
-                    loss *= 4.
-
-            # Backward
-            scaler.scale(loss).backward()
+            # DDP: skip gradient all-reduce on accumulation-only steps, gradients sync on the optimizer step
+            sync_context = model.no_sync if (rank != -1 and ni % accumulate != 0) else contextlib.nullcontext
+            with sync_context():
+                # Forward
+                with amp.autocast(enabled=cuda):
+                    pred = model(imgs)  # forward
+                    loss, loss_items = compute_loss(pred, targets.to(device, non_blocking=True))  # scaled by batch_size
+                    if rank != -1:
+                        loss *= opt.world_size  # gradient averaged between devices in DDP mode
+                    if opt.quad:
+                        loss *= 4.
+
+                # Backward
+                scaler.scale(loss).backward()
 
             # Optimize
             if ni % accumulate == 0:
                 scaler.step(optimizer)  # optimizer.step
                 scaler.update()
-                optimizer.zero_grad()
+                optimizer.zero_grad(set_to_none=True)
                 if ema:
                     ema.update(model)
 
@@ -460,12 +514,13 @@ def train(hyp, opt, device, tb_writer=None):
             # mAP
             ema.update_attr(model, include=['yaml', 'nc', 'hyp', 'gr', 'names', 'stride', 'class_weights'])
             final_epoch = epoch + 1 == epochs
-            if not opt.notest or final_epoch:  # Calculate mAP
+            tested = (not opt.notest and (epoch + 1) % opt.test_interval == 0) or final_epoch
+            if tested:  # Calculate mAP
                 wandb_logger.current_epoch = epoch + 1
                 results, maps, times = test.test(data_dict,
                                                  batch_size=batch_size * 2,
                                                  imgsz=imgsz_test,
-                                                 model=ema.ema,
+                                                 model=ema.ema,  # test() runs it in FP16 on CUDA, returns it FP32
                                                  single_cls=opt.single_cls,
                                                  dataloader=testloader,
                                                  save_dir=save_dir,
@@ -476,8 +531,10 @@ def train(hyp, opt, device, tb_writer=None):
                                                  is_coco=is_coco)
 
             # Write
+            line = s + '%10.4g' * 7 % (results if tested else (float('nan'),) * 7) + '\n'  # metrics, val_loss
+            results_text += line
             with open(results_file, 'a') as f:
-                f.write(s + '%10.4g' * 7 % results + '\n')  # append metrics, val_loss
+                f.write(line)  # append
             if len(opt.name) and opt.bucket:
                 os.system('gsutil cp %s gs://%s/results/results%s.txt' % (results_file, opt.bucket, opt.name))
 
@@ -486,42 +543,55 @@ def train(hyp, opt, device, tb_writer=None):
                     'metrics/precision', 'metrics/recall', 'metrics/mAP_0.5', 'metrics/mAP_0.5:0.95',
                     'val/box_loss', 'val/obj_loss', 'val/cls_loss',  # val loss
                     'x/lr0', 'x/lr1', 'x/lr2']  # params
-            for x, tag in zip(list(mloss[:-1]) + list(results) + lr, tags):
+            for x, tag in zip(list(mloss[:-1]) + (list(results) if tested else [None] * 7) + lr, tags):
+                if x is None:  # metrics not computed this epoch
+                    continue
                 if tb_writer:
                     tb_writer.add_scalar(tag, x, epoch)  # tensorboard
                 if wandb_logger.wandb:
                     wandb_logger.log({tag: x})  # W&B
 
             # Update best mAP
-            fi = fitness(np.array(results).reshape(1, -1))  # weighted combination of [P, R, mAP@.5, mAP@.5-.95]
-            if fi > best_fitness:
-                best_fitness = fi
-            wandb_logger.end_epoch(best_result=best_fitness == fi)
+            fi, is_best = None, False  # only epochs with fresh test results can be best
+            if tested:
+                fi = fitness(np.array(results).reshape(1, -1))  # weighted combination of [P, R, mAP@.5, mAP@.5-.95]
+                if fi > best_fitness:
+                    best_fitness = fi
+                is_best = best_fitness == fi
+            wandb_logger.end_epoch(best_result=is_best)
 
             # Save model
             if (not opt.nosave) or (final_epoch and not opt.evolve):  # if save
+                de_model = model.module if is_parallel(model) else model
                 ckpt = {'epoch': epoch,
                         'best_fitness': best_fitness,
-                        'training_results': results_file.read_text(),
-                        'model': deepcopy(model.module if is_parallel(model) else model).half(),
-                        'ema': deepcopy(ema.ema).half(),
+                        'training_results': results_text,
+                        'model_state_dict': half_state_dict(de_model),  # FP16 CPU copy, no module deepcopy
+                        'yaml': de_model.yaml,  # to rebuild Model() on load
+                        'names': names,
+                        'ema_state_dict': half_state_dict(ema.ema),
                         'updates': ema.updates,
-                        'optimizer': optimizer.state_dict(),
+                        'optimizer': cpu_state_dict(optimizer.state_dict()),  # snapshot, training continues
                         'wandb_id': wandb_logger.wandb_run.id if wandb_logger.wandb else None}
 
                 # Save last, best and delete
-                torch.save(ckpt, last)
-                if best_fitness == fi:
-                    torch.save(ckpt, best)
+                if save_thread:
+                    save_thread.join()  # previous checkpoint write must finish first
+                save_thread = CheckpointWriter(ckpt, last, best if is_best else None)
+                save_thread.start()
                 if wandb_logger.wandb:
                     if ((epoch + 1) % opt.save_period == 0 and not final_epoch) and opt.save_period != -1:
+                        save_thread.join()
                         wandb_logger.log_model(
-                            last.parent, opt, epoch, fi, best_model=best_fitness == fi)
+                            last.parent, opt, epoch, fi, best_model=is_best)
                 del ckpt
 
         # end epoch ----------------------------------------------------------------------------------------------------
     # end training
     if rank in [-1, 0]:
+        if save_thread:
+            save_thread.join()  # wait for last checkpoint write
+
         # Plots
         if plots:
             plot_results(save_dir=save_dir)  # save as results.png
@@ -577,6 +647,7 @@ if __name__ == '__main__':
     parser.add_argument('--resume', nargs='?', const=True, default=False, help='resume most recent training')
     parser.add_argument('--nosave', action='store_true', help='only save final checkpoint')
     parser.add_argument('--notest', action='store_true', help='only test final epoch')
+    parser.add_argument('--test-interval', type=int, default=1, help='test every n epochs, final epoch always tested')
     parser.add_argument('--noautoanchor', action='store_true', help='disable autoanchor check')
     parser.add_argument('--evolve', action='store_true', help='evolve hyperparameters')
     parser.add_argument('--bucket', type=str, default='', help='gsutil bucket')
@@ -634,12 +705,14 @@ if __name__ == '__main__':
         apriori = opt.global_rank, opt.local_rank
         with open(Path(ckpt).parent.parent / 'opt.yaml') as f:
             opt = argparse.Namespace(**yaml.load(f, Loader=yaml.SafeLoader))  # replace
+        opt.__dict__.setdefault('test_interval', 1)  # opt.yaml saved before --test-interval existed
         opt.cfg, opt.weights, opt.resume, opt.batch_size, opt.global_rank, opt.local_rank = '', ckpt, True, opt.total_batch_size, *apriori  # reinstate
         logger.info('Resuming training from %s' % ckpt)
     else:
         # opt.hyp = opt.hyp or ('hyp.finetune.yaml' if opt.weights else 'hyp.scratch.yaml')
         opt.data, opt.cfg, opt.hyp = check_file(opt.data), check_file(opt.cfg), check_file(opt.hyp)  # check files
         assert len(opt.cfg) or len(opt.weights), 'either --cfg or --weights must be specified'
+        assert opt.test_interval >= 1, '--test-interval must be >= 1'
         opt.img_size.extend([opt.img_size[-1]] * (2 - len(opt.img_size)))  # extend to 2 sizes (train, test)
         opt.name = 'evolve' if opt.evolve else opt.name
         opt.save_dir = increment_path(Path(opt.project) / opt.name, exist_ok=opt.exist_ok | opt.evolve)  # increment run
@@ -57,7 +57,8 @@ def exif_size(img):
 
 
 def create_dataloader(path, imgsz, batch_size, stride, opt, hyp=None, augment=False, cache=False, pad=0.0, rect=False,
-                      rank=-1, world_size=1, workers=8, image_weights=False, quad=False, prefix='', do_semi=False):
+                      rank=-1, world_size=1, workers=8, image_weights=False, quad=False, prefix='', do_semi=False,
+                      pin_memory=True, semi_batch_size=None):
     # Make sure only the first process in DDP process the dataset first, and the following others can use the cache
     with torch_distributed_zero_first(rank):
         dataset = LoadImagesAndLabels(path, imgsz, batch_size,
@@ -79,12 +80,14 @@ def create_dataloader(path, imgsz, batch_size, stride, opt, hyp=None, augment=Fa
                         batch_size=batch_size,
                         num_workers=nw,
                         sampler=sampler,
-                        pin_memory=True,
+                        pin_memory=pin_memory,  # page-locked batches for async H2D copies
+                        persistent_workers=nw > 0 and not image_weights,  # image_weights updates dataset.indices
                         collate_fn=LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn)
     ###############   modified  #################
     if do_semi:
         path = path + '../Unlabeled'
-        unlabeldataset = LoadImagesAndLabels(path, imgsz, batch_size,
+        semi_batch_size = semi_batch_size or batch_size * 2  # inference-only pass, larger batches amortize launches
+        unlabeldataset = LoadImagesAndLabels(path, imgsz, semi_batch_size,
                                       augment=augment,  # augment images
                                       hyp=hyp,  # augmentation hyperparameters
                                       rect=rect,  # rectangular training
@@ -95,12 +98,14 @@ def create_dataloader(path, imgsz, batch_size, stride, opt, hyp=None, augment=Fa
                                       image_weights=image_weights,
                                       prefix=prefix,
                                       do_semi=do_semi)
+        semi_batch_size = min(semi_batch_size, len(unlabeldataset))
         sampler = torch.utils.data.distributed.DistributedSampler(unlabeldataset) if rank != -1 else None
         unlabeldataloader = loader(unlabeldataset,
-                        batch_size=batch_size*2,
+                        batch_size=semi_batch_size,
                         num_workers=nw,
                         sampler=sampler,
-                        pin_memory=True,
+                        pin_memory=pin_memory,  # page-locked batches for async H2D copies
+                        persistent_workers=nw > 0 and not image_weights,  # image_weights updates dataset.indices
                         collate_fn=LoadImagesAndLabels.collate_fn4 if quad else LoadImagesAndLabels.collate_fn)
         return dataloader, dataset, unlabeldataloader
     ###############   modified  #################
@@ -141,6 +146,40 @@ class _RepeatSampler(object):
             yield from iter(self.sampler)
 
 
+class DataPrefetcher:
+    """ Dataloader wrapper that copies the next batch of images to device on a side CUDA stream
+
+    Overlaps the host-to-device copy of batch i+1 with processing of batch i. Yields (batch, imgs) where batch is the
+    loader output and imgs are its batch[0] images on device. Plain iteration on CPU devices.
+    """
+
+    def __init__(self, loader, device):
+        self.loader = loader
+        self.device = device
+        self.stream = torch.cuda.Stream(device) if device.type != 'cpu' else None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        loader = iter(self.loader)
+        batch = self.preload(loader)
+        while batch is not None:
+            if self.stream:
+                torch.cuda.current_stream(self.device).wait_stream(self.stream)  # copy must finish before use
+                batch[1].record_stream(torch.cuda.current_stream(self.device))  # allocated on side stream
+            next_batch = self.preload(loader)  # start copying the next batch
+            yield batch
+            batch = next_batch
+
+    def preload(self, loader):
+        batch = next(loader, None)
+        if batch is None:
+            return None
+        with torch.cuda.stream(self.stream):  # no-op if stream is None
+            return batch, batch[0].to(self.device, non_blocking=True)
+
+
 class LoadImages:  # for inference
     def __init__(self, path, img_size=640, stride=32):
         p = str(Path(path).absolute())  # os-agnostic absolute path
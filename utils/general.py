@@ -218,7 +218,8 @@ def labels_to_class_weights(labels, nc=80):
     if labels[0] is None:  # no labels loaded
         return torch.Tensor()
 
-    labels = np.concatenate(labels, 0)  # labels.shape = (866643, 5) for COCO
+    if isinstance(labels, (list, tuple)):  # per-image labels
+        labels = np.concatenate(labels, 0)  # labels.shape = (866643, 5) for COCO
     classes = labels[:, 0].astype(np.int)  # labels = [class xywh]
     weights = np.bincount(classes, minlength=nc)  # occurrences per class
 
@@ -512,14 +513,17 @@ def non_max_suppression(prediction, conf_thres=0.25, iou_thres=0.45, classes=Non
 def strip_optimizer(f='best.pt', s=''):  # from utils.general import *; strip_optimizer()
     # Strip optimizer from 'f' to finalize training, optionally save as 's'
     x = torch.load(f, map_location=torch.device('cpu'))
-    if x.get('ema'):
-        x['model'] = x['ema']  # replace model with ema
-    for k in 'optimizer', 'training_results', 'wandb_id', 'ema', 'updates':  # keys
+    if x.get('ema') is not None:
+        x['model'], x['model_state_dict'] = x['ema'], None  # replace model with ema
+    elif x.get('ema_state_dict') is not None:
+        x['model'], x['model_state_dict'] = None, x['ema_state_dict']  # replace model state_dict with ema state_dict
+    for k in 'optimizer', 'training_results', 'wandb_id', 'ema', 'ema_state_dict', 'updates':  # keys
         x[k] = None
     x['epoch'] = -1
-    x['model'].half()  # to FP16
-    for p in x['model'].parameters():
-        p.requires_grad = False
+    if x.get('model') is not None:  # nn.Module checkpoint, state_dict checkpoints are saved FP16 without grads
+        x['model'].half()  # to FP16
+        for p in x['model'].parameters():
+            p.requires_grad = False
     torch.save(x, s or f)
     mb = os.path.getsize(s or f) / 1E6  # filesize
     print(f"Optimizer stripped from {f},{(' saved as %s,' % s) if s else ''} {mb:.1f}MB")
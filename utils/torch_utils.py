@@ -141,6 +141,30 @@ def intersect_dicts(da, db, exclude=()):
     return {k: v for k, v in da.items() if k in db and not any(x in k for x in exclude) and v.shape == db[k].shape}
 
 
+def half_state_dict(model):
+    # Returns a detached FP16 CPU copy of model.state_dict() for lightweight checkpoints (no module deepcopy)
+    return {k: v.detach().to('cpu', torch.half if v.is_floating_point() else v.dtype, copy=True)
+            for k, v in model.state_dict().items()}
+
+
+def cpu_state_dict(x):
+    # Returns a detached CPU copy of state_dict x, recursing into dicts and lists, i.e. optimizer.state_dict() snapshots
+    if isinstance(x, torch.Tensor):
+        return x.detach().to('cpu', copy=True)
+    if isinstance(x, dict):
+        return {k: cpu_state_dict(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return type(x)(cpu_state_dict(v) for v in x)
+    return x
+
+
+def ckpt_state_dict(ckpt, key='model'):
+    # Returns FP32 state_dict of checkpoint entry 'key', saved either as nn.Module (key) or state_dict (key_state_dict)
+    if ckpt.get(key) is not None:
+        return ckpt[key].float().state_dict()
+    return {k: v.float() if v.is_floating_point() else v for k, v in ckpt[f'{key}_state_dict'].items()}
+
+
 def initialize_weights(model):
     for m in model.modules():
         t = type(m)